@@ -10,7 +10,7 @@ CREATE TABLE IF NOT EXISTS faq_embeddings (
     question TEXT NOT NULL,
     answer TEXT,
     match_weight INTEGER DEFAULT 5,
-    embedding vector(4096),  -- Qwen3 embedding dimension is 4096
+    embedding vector(4096),  -- Qwen3 embedding dimension is 4096; stored L2-normalized (unit length)
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -27,7 +27,12 @@ CREATE TABLE IF NOT EXISTS faq_keywords (
 -- Indexes for faq_embeddings
 CREATE INDEX IF NOT EXISTS idx_faq_category ON faq_embeddings(category);
 CREATE INDEX IF NOT EXISTS idx_faq_question ON faq_embeddings USING gin(question gin_trgm_ops);
-CREATE INDEX IF NOT EXISTS idx_faq_embedding ON faq_embeddings USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+-- pgvector indexes are limited to 2000 dimensions, so the 4096-dimensional embeddings are
+-- indexed as binary-quantized bit vectors (pgvector >= 0.7) and re-ranked by exact similarity.
+-- For a large initial load, run this statement after the data is inserted: building the HNSW
+-- graph once is much faster than maintaining it on every insert.
+CREATE INDEX IF NOT EXISTS idx_faq_embedding_hnsw ON faq_embeddings
+    USING hnsw ((binary_quantize(embedding)::bit(4096)) bit_hamming_ops) WITH (m = 16, ef_construction = 64);
 
 -- Indexes for faq_keywords
 CREATE INDEX IF NOT EXISTS idx_faq_keywords_keyword ON faq_keywords(keyword);
@@ -74,6 +79,19 @@ INSERT INTO faq_keywords (faq_id, keyword) VALUES
 
 -- Query examples for finding similar FAQs
 /*
+SET LOCAL hnsw.ef_search = 100;
+-- Stored vectors are unit length, so the inner product (<#> is its negative) is the cosine similarity
+SELECT faq_id, category, question, answer,
+       -(embedding <#> '[QUERY_EMBEDDING_HERE]'::vector) AS cosine_similarity
+FROM (
+    SELECT * FROM faq_embeddings
+    ORDER BY binary_quantize(embedding)::bit(4096) <~> binary_quantize('[QUERY_EMBEDDING_HERE]'::vector)
+    LIMIT 100
+) candidates
+ORDER BY embedding <#> '[QUERY_EMBEDDING_HERE]'::vector
+LIMIT 5;
+
+-- Exact (unindexed) scan
 SELECT fe.faq_id, fe.category, fe.question, fe.answer,
        1 - (fe.embedding <=> '[QUERY_EMBEDDING_HERE]'::vector) AS cosine_similarity
 FROM faq_embeddings fe
@@ -1,11 +1,125 @@
 # embeddings.py
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
+import httpx
 import ollama
+from utils.embedding_cache import EmbeddingCache
 
-def generate_embeddings(texts: List[str]) -> List[List[float]]:
-    embeddings = []
+MODEL = "qwen3-embedding:latest"
+BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 64))
+# Upper bound on the total characters in one batch, so a few long texts cannot exhaust server memory
+BATCH_MAX_CHARS = int(os.getenv('EMBED_BATCH_MAX_CHARS', 150000))
+# Batches in flight at once per Ollama instance; Ollama serves up to OLLAMA_NUM_PARALLEL requests concurrently
+CONCURRENCY = int(os.getenv('EMBED_CONCURRENCY', 4))
+
+def _make_client(host=None):
+    return ollama.Client(
+        host=host,
+        timeout=httpx.Timeout(300.0, connect=10.0),
+        limits=httpx.Limits(max_keepalive_connections=16, max_connections=32, keepalive_expiry=30.0),
+    )
+
+# Created once so every batch reuses pooled keep-alive connections to Ollama. OLLAMA_HOSTS
+# lists several instances (e.g. one per GPU) that batches are spread across round-robin.
+_clients = [_make_client(host.strip()) for host in os.getenv('OLLAMA_HOSTS', '').split(',') if host.strip()]
+if not _clients:
+    _clients = [_make_client()]
+
+# Opened on first use; set EMBED_CACHE=0 to always call the model
+_cache = None
+# Cache key prefix naming the exact model weights, resolved once per process
+_cache_model_key = None
+
+def _resolve_model_key():
+    # MODEL is a tag that `ollama pull` can move to new weights, so cached vectors are
+    # keyed by the digest it currently points to on every configured instance
+    digests = set()
+    for client in _clients:
+        try:
+            models = client.list()['models']
+        except (ollama.ResponseError, ConnectionError, httpx.HTTPError):
+            return None
+        digests.add(next((m['digest'] for m in models if m['model'] == MODEL), None))
+    if len(digests) != 1 or None in digests:
+        return None
+    return f"{MODEL}@{digests.pop()}"
+
+def _get_cache():
+    global _cache, _cache_model_key
+    if os.getenv('EMBED_CACHE', '1') == '0':
+        return None
+    if _cache_model_key is None:
+        _cache_model_key = _resolve_model_key() or ''
+        if not _cache_model_key:
+            print(f"Warning: could not determine the digest of {MODEL}; embedding cache disabled")
+    if not _cache_model_key:
+        return None
+    if _cache is None:
+        _cache = EmbeddingCache()
+    return _cache
+
+def _embed_sequential(client: ollama.Client, texts: List[str]) -> List[List[float]]:
+    # Legacy /api/embeddings endpoint, one request per text
+    return [client.embeddings(model=MODEL, prompt=text)['embedding'] for text in texts]
+
+def _embed_batch(client: ollama.Client, texts: List[str]) -> List[List[float]]:
+    try:
+        response = client.embed(model=MODEL, input=texts)
+    except ollama.ResponseError as e:
+        # Ollama servers older than v0.1.35 have no /api/embed endpoint
+        if e.status_code == 404:
+            return _embed_sequential(client, texts)
+        # A batch the server cannot handle (e.g. out of memory) is retried one text at a time
+        if len(texts) > 1:
+            return [embedding for text in texts for embedding in _embed_batch(client, [text])]
+        raise
+
+    embeddings = response.get('embeddings')
+    if not embeddings or len(embeddings) != len(texts):
+        return _embed_sequential(client, texts)
+    return embeddings
+
+def _make_batches(texts: List[str], batch_size: int) -> List[List[str]]:
+    # Chunk texts so each /api/embed request stays well under the timeout and server memory
+    batches = []
+    batch = []
+    batch_chars = 0
     for text in texts:
-        # Generate embedding using Ollama's qwen3-embedding model
-        response = ollama.embeddings(model="qwen3-embedding:latest", prompt=text)
-        embeddings.append(response['embedding'])
+        if batch and (len(batch) >= batch_size or batch_chars + len(text) > BATCH_MAX_CHARS):
+            batches.append(batch)
+            batch = []
+            batch_chars = 0
+        batch.append(text)
+        batch_chars += len(text)
+    if batch:
+        batches.append(batch)
+    return batches
+
+def _generate_uncached(texts: List[str], batch_size: int) -> List[List[float]]:
+    batches = _make_batches(texts, batch_size)
+    clients = [_clients[i % len(_clients)] for i in range(len(batches))]
+    max_workers = min(CONCURRENCY * len(_clients), len(batches))
+    if max_workers <= 1:
+        results = [_embed_batch(client, batch) for client, batch in zip(clients, batches)]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_embed_batch, clients, batches))
+
+    embeddings = []
+    for batch_embeddings in results:
+        embeddings.extend(batch_embeddings)
     return embeddings
+
+def generate_embeddings(texts: List[str], batch_size: int = BATCH_SIZE) -> List[List[float]]:
+    # Embed each distinct text once and scatter the vectors back to every position that uses it
+    unique_texts = list(dict.fromkeys(texts))
+    if len(unique_texts) < len(texts):
+        lookup = dict(zip(unique_texts, generate_embeddings(unique_texts, batch_size)))
+        return [lookup[text] for text in texts]
+
+    cache = _get_cache()
+    if cache is None:
+        return _generate_uncached(texts, batch_size)
+    return cache.get_or_compute_many(texts, _cache_model_key,
+                                     lambda missing: _generate_uncached(missing, batch_size))
@@ -2,22 +2,60 @@
 """
 Query script to find similar FAQs using vector similarity (fixed for PostgreSQL)
 """
+import argparse
+import functools
 import os
 import sys
 from getpass import getpass
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from utils.db import DatabaseConnection
 from src.embeddings import generate_embeddings
+from utils.db_utils import normalize_embeddings, to_vector_literal
 import numpy as np
 
-def cosine_similarity(vec1, vec2):
-    """Calculate cosine similarity between two vectors"""
-    dot_product = np.dot(vec1, vec2)
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-    return dot_product / (norm1 * norm2)
+# FAQs shown per question in the interactive prompt
+TOP_K = 3
+
+# Parsed FAQ embeddings, reloaded only when the faq_embeddings table changes
+_faq_cache = {}
+
+def _faq_table_version(db_connection, dimension):
+    """Cheap token that changes whenever FAQs are added, updated or removed"""
+    result = db_connection.execute_query(
+        "SELECT count(*) AS row_count, max(updated_at) AS last_updated FROM faq_embeddings;"
+    )
+    return ('faq_embeddings', dimension, result[0]['row_count'], result[0]['last_updated'])
+
+def _load_faq_cache(db_connection, version, dimension):
+    """Load stored FAQ embeddings into a float32 matrix of unit vectors"""
+    print("Retrieving stored embeddings from database...")
+    query = """
+    SELECT faq_id, category, question, answer, vector_send(embedding) AS embedding
+    FROM faq_embeddings;
+    """
+    # Rows are streamed from a server-side cursor, so raw rows never pile up next to the parsed matrix
+    results = db_connection.execute_query_iter(query)
+
+    # Column-oriented layout: one array per field, row i of E_norm belongs to index i of each column
+    columns = {name: [] for name in ('faq_id', 'category', 'question', 'answer')}
+    vectors = []
+    for row in results:
+        # pgvector binary format: int16 dimension, int16 unused, then big-endian float4 values
+        stored_embedding = np.frombuffer(row['embedding'], dtype='>f4', offset=4)
+
+        if len(stored_embedding) != dimension:
+            print(f"Warning: Embedding dimension mismatch for FAQ {row['faq_id']}")
+            continue
+
+        for name, column in columns.items():
+            column.append(row[name])
+        vectors.append(stored_embedding)
+
+    _faq_cache['version'] = version
+    _faq_cache['columns'] = {name: np.array(column, dtype=object) for name, column in columns.items()}
+    # Rows ingested before embeddings were normalized at write time are not unit length;
+    # normalizing here costs once per table version and keeps E_norm @ q a cosine similarity
+    _faq_cache['E_norm'] = normalize_embeddings(np.array(vectors, dtype=np.float32).reshape(len(vectors), dimension))
 
 def query_faqs(user_query, db_connection, top_k=5, min_similarity_threshold=0.6):
     """Query the database for FAQs similar to the user query"""
@@ -26,48 +64,69 @@ def query_faqs(user_query, db_connection, top_k=5, min_similarity_threshold=0.6)
     query_embeddings = generate_embeddings([user_query])
     query_embedding = query_embeddings[0]
 
-    # Retrieve all embeddings from the database
-    print("Retrieving stored embeddings from database...")
-    query = """
-    SELECT faq_id, category, question, answer, embedding
-    FROM faq_embeddings;
-    """
-
     try:
-        results = db_connection.execute_query(query)
-        if not results:
+        dimension = len(query_embedding)
+        version = _faq_table_version(db_connection, dimension)
+        if _faq_cache.get('version') != version:
+            _load_faq_cache(db_connection, version, dimension)
+        if _faq_cache['E_norm'].shape[0] == 0:
             print("No FAQs found in the database.")
             return []
 
-        # Calculate similarity scores
-        similarities = []
-        for row in results:
-            # PostgreSQL vector format can be like "{val1,val2,val3,...}" or "[val1, val2, val3, ...]"
-            # Clean the string to remove brackets and braces
-            embedding_str = row['embedding']
-            # Remove leading/trailing brackets or braces
-            embedding_str = embedding_str.strip('[]{}')
-            if embedding_str:
-                # Split by comma and convert to float
-                stored_embedding = [float(x.strip()) for x in embedding_str.split(',') if x.strip()]
-            else:
-                stored_embedding = []
-
-            if len(stored_embedding) != len(query_embedding):
-                print(f"Warning: Embedding dimension mismatch for FAQ {row['faq_id']}")
-                continue
+        # Stored vectors are unit length, so normalizing the query turns one
+        # matrix-vector product into the cosine similarity against every FAQ
+        q = normalize_embeddings(query_embedding)
+        scores = _faq_cache['E_norm'] @ q
 
-            similarity = cosine_similarity(query_embedding, stored_embedding)
-            similarities.append((similarity, row))
+        # Filter on the minimum similarity threshold, select the top_k with a linear-time
+        # partition and sort only those
+        candidates = np.flatnonzero(scores >= min_similarity_threshold)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k)[:top_k]]
+        top = candidates[np.argsort(-scores[candidates], kind='stable')]
 
-        # Sort by similarity score in descending order
-        similarities.sort(key=lambda x: x[0], reverse=True)
+        # Only the returned FAQs are materialized as dicts
+        columns = _faq_cache['columns']
+        return [(float(scores[i]), {name: column[i] for name, column in columns.items()}) for i in top]
 
-        # Filter results based on minimum similarity threshold
-        filtered_results = [(sim, row) for sim, row in similarities if sim >= min_similarity_threshold]
+    except Exception as e:
+        print(f"Error querying database: {e}")
+        import traceback
+        traceback.print_exc()
+        return []
+
+def query_faqs_pgvector(user_query, db_connection, top_k=5, min_similarity_threshold=0.6, ef_search=100):
+    """Query FAQs with the k-NN search pushed down to PostgreSQL (pgvector HNSW index)"""
+    print("Generating embedding for your query...")
+    query_embeddings = generate_embeddings([user_query])
+    query_embedding = query_embeddings[0]
 
-        # Return top_k results that meet the threshold
-        return filtered_results[:top_k]
+    # The HNSW index is built over binary-quantized vectors (pgvector cannot index
+    # 4096-dimensional vectors directly); ef_search candidates are fetched from it and
+    # re-scored by exact inner product, which equals cosine similarity because stored
+    # vectors are unit length
+    query = """
+    SET LOCAL hnsw.ef_search = %s;
+    WITH q AS (SELECT %s::vector AS v)
+    SELECT faq_id, category, question, answer, -(embedding <#> (SELECT v FROM q)) AS similarity
+    FROM (
+        SELECT faq_id, category, question, answer, embedding
+        FROM faq_embeddings
+        ORDER BY binary_quantize(embedding)::bit(4096) <~> binary_quantize((SELECT v FROM q))
+        LIMIT %s
+    ) candidates
+    WHERE embedding <#> (SELECT v FROM q) <= %s
+    ORDER BY embedding <#> (SELECT v FROM q)
+    LIMIT %s;
+    """
+
+    try:
+        # <#> is the negative inner product; only rows meeting the similarity threshold are returned
+        q = to_vector_literal(normalize_embeddings(query_embedding))
+        results = db_connection.execute_query(
+            query, (ef_search, q, ef_search, -min_similarity_threshold, top_k)
+        )
+        return [(row.pop('similarity'), row) for row in results]
 
     except Exception as e:
         print(f"Error querying database: {e}")
@@ -75,7 +134,36 @@ def query_faqs(user_query, db_connection, top_k=5, min_similarity_threshold=0.6)
         traceback.print_exc()
         return []
 
+def _ef_search_arg(value):
+    # pgvector rejects hnsw.ef_search outside 1..1000
+    try:
+        ef_search = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer: {value!r}")
+    if not 1 <= ef_search <= 1000:
+        raise argparse.ArgumentTypeError(f"must be between 1 and 1000, got {ef_search}")
+    return ef_search
+
 def main():
+    parser = argparse.ArgumentParser(description="Xuno FAQ Query System")
+    parser.add_argument('--backend', choices=['memory', 'pgvector'], default='memory',
+                        help="score FAQs in memory (default) or search the pgvector HNSW index in PostgreSQL")
+    parser.add_argument('--ef-search', type=_ef_search_arg, default=100,
+                        help="pgvector backend: quantized index candidates re-scored exactly per query "
+                             "(default 100; ignored by the memory backend)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="always call the embedding model instead of reusing cached query embeddings")
+    args = parser.parse_args()
+    if args.backend == 'pgvector' and args.ef_search < TOP_K:
+        # Fewer index candidates than requested results would silently truncate the answer
+        parser.error(f"--ef-search must be at least {TOP_K}, the number of FAQs shown per question")
+    if args.no_cache:
+        os.environ['EMBED_CACHE'] = '0'  # Set for generate_embeddings
+    if args.backend == 'pgvector':
+        search = functools.partial(query_faqs_pgvector, ef_search=args.ef_search)
+    else:
+        search = query_faqs
+
     print("Xuno FAQ Query System")
     print("Type \"quit\" or \"exit\" to exit the program")
     print("-" * 50)
@@ -101,7 +189,7 @@ def main():
                 continue
 
             # Find similar FAQs with minimum similarity threshold
-            results = query_faqs(user_input, db, top_k=3, min_similarity_threshold=0.6)
+            results = search(user_input, db, top_k=TOP_K, min_similarity_threshold=0.6)
 
             if not results:
                 print("Sorry the query is out of my knowledge base!")
@@ -2,57 +2,45 @@
 """
 Enhanced embedding generator that stores directly to PostgreSQL database
 """
+import argparse
 import json
 import os
 import sys
+from collections import defaultdict
+from pathlib import Path
 from typing import List, Dict, Tuple
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from src.embeddings import generate_embeddings
 from utils.db import DatabaseConnection
-from utils.db_utils import ensure_vector_extension, ensure_table_schema
+from utils.db_utils import normalize_embeddings, to_vector_literal, upsert_faq_embeddings
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+def _load_json_list(path: str) -> List[Dict]:
+    """
+    Load a JSON list from path, resolved against the working directory or, failing that, the script location
+    """
+    for candidate in (Path(path), SCRIPT_DIR / path):
+        if candidate.exists():
+            with open(candidate, "r") as f:
+                return json.load(f)
+    print(f"Warning: {path} not found")
+    return []
 
 def load_faqs_with_keywords(intents_file: str, keywords_file: str) -> List[Dict]:
     """
     Load FAQs and combine each FAQ with its associated keywords
     """
-    # Load intents (main FAQ data)
-    if os.path.exists(intents_file):
-        with open(intents_file, "r") as f:
-            intents_data = json.load(f)
-    else:
-        # Try relative path from script location
-        script_dir = os.path.dirname(__file__)
-        intents_path = os.path.join(script_dir, "..", intents_file)
-        if os.path.exists(intents_path):
-            with open(intents_path, "r") as f:
-                intents_data = json.load(f)
-        else:
-            print(f"Warning: {intents_file} not found")
-            intents_data = []
+    # Load intents (main FAQ data) and keywords
+    intents_data = _load_json_list(intents_file)
+    keywords_data = _load_json_list(keywords_file)
 
-    # Load keywords
-    if os.path.exists(keywords_file):
-        with open(keywords_file, "r") as f:
-            keywords_data = json.load(f)
-    else:
-        # Try relative path from script location
-        script_dir = os.path.dirname(__file__)
-        keywords_path = os.path.join(script_dir, "..", keywords_file)
-        if os.path.exists(keywords_path):
-            with open(keywords_path, "r") as f:
-                keywords_data = json.load(f)
-        else:
-            print(f"Warning: {keywords_file} not found")
-            keywords_data = []
-    
     # Create a mapping from faq_id to keywords
-    keywords_by_faq = {}
+    keywords_by_faq = defaultdict(list)
     for keyword_entry in keywords_data:
         faq_id = keyword_entry.get("faq_id")
         keyword = keyword_entry.get("keyword")
         if faq_id and keyword:
-            if faq_id not in keywords_by_faq:
-                keywords_by_faq[faq_id] = []
             keywords_by_faq[faq_id].append(keyword)
     
     # Combine intents with their keywords
@@ -77,28 +65,17 @@ def save_enhanced_embeddings_to_db(db_connection, faqs: List[Dict], embeddings:
     """
     Save enhanced FAQ embeddings to PostgreSQL database
     """
-    ensure_vector_extension(db_connection)
-    ensure_table_schema(db_connection)
-    
-    for i, (faq, embedding) in enumerate(zip(faqs, embeddings)):
-        query = """INSERT INTO faq_embeddings (faq_id, category, question, answer, match_weight, embedding)
-VALUES (%s, %s, %s, %s, %s, %s::vector)
-ON CONFLICT (faq_id) DO UPDATE SET
-    category = EXCLUDED.category,
-    question = EXCLUDED.question,
-    answer = EXCLUDED.answer,
-    match_weight = EXCLUDED.match_weight,
-    embedding = EXCLUDED.embedding;"""
-        db_connection.execute_update(query, (
-            faq.get("faq_id"),
-            faq.get("category"),
-            faq.get("question"),
-            faq.get("answer"),
-            faq.get("match_weight", 5),
-            embedding
-        ))
-        if (i + 1) % 10 == 0:
-            print(f"Processed {i + 1}/{len(faqs)} embeddings...")
+    # Rows are produced lazily and consumed page by page by the INSERT or COPY
+    rows = ((
+        faq.get("faq_id"),
+        faq.get("category"),
+        faq.get("question"),
+        faq.get("answer"),
+        faq.get("match_weight", 5),
+        to_vector_literal(embedding)
+    ) for faq, embedding in zip(faqs, normalize_embeddings(embeddings)))
+    upsert_faq_embeddings(db_connection,
+                          ["faq_id", "category", "question", "answer", "match_weight", "embedding"], rows)
     print(f"Successfully saved {len(faqs)} enhanced embeddings to the database.")
 
 def generate_and_store_enhanced_embeddings(faq_files: List[str]):
@@ -117,6 +94,7 @@ def generate_and_store_enhanced_embeddings(faq_files: List[str]):
     # Extract the combined text for embedding
     texts_to_embed = [faq.get("combined_text_for_embedding", faq.get("question", "")) for faq in faqs]
     
+    # generate_embeddings embeds each distinct text only once
     print(f"Generating enhanced embeddings for {len(texts_to_embed)} combined FAQ+keyword entries...")
     embeddings = generate_embeddings(texts_to_embed)
     
@@ -139,6 +117,13 @@ def generate_and_store_enhanced_embeddings(faq_files: List[str]):
         db.disconnect()
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate FAQ embeddings and store them in PostgreSQL")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="always call the embedding model instead of reusing cached embeddings")
+    args = parser.parse_args()
+    if args.no_cache:
+        os.environ['EMBED_CACHE'] = '0'  # Set for generate_embeddings
+
     faq_files = ["../data/faq_intents.json", "../data/faq_keywords.json"]
     generate_and_store_enhanced_embeddings(faq_files)
 
@@ -1,8 +1,18 @@
 # db.py
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 import os
 import getpass
+import itertools
+import threading
+
+# One pool per set of connection settings, shared by every DatabaseConnection in the
+# process, so repeated connect()/disconnect() cycles reuse open server connections
+_pools = {}
+_pools_lock = threading.Lock()
+# Server-side (named) cursors need a unique name within a transaction
+_cursor_ids = itertools.count()
 
 class DatabaseConnection:
     def __init__(self, host=None, database=None, user=None,
@@ -13,20 +23,32 @@ class DatabaseConnection:
         self.password = password or os.getenv('DB_PASSWORD', '')
         self.port = port or int(os.getenv('DB_PORT', 5432))
         self.use_password_prompt = use_password_prompt
+        self.pool = None
         self.connection = None
 
         if not self.password and self.use_password_prompt:
             self.password = getpass.getpass(f"Enter password for database user '{self.user}': ")
 
+    def _get_pool(self):
+        key = (self.host, self.database, self.user, self.password, self.port)
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ThreadedConnectionPool(
+                    1, int(os.getenv('DB_POOL_MAX', 8)),
+                    host=self.host,
+                    database=self.database,
+                    user=self.user,
+                    password=self.password,
+                    port=self.port,
+                    keepalives=1,
+                    keepalives_idle=30
+                )
+            return _pools[key]
+
     def connect(self):
         try:
-            self.connection = psycopg2.connect(
-                host=self.host,
-                database=self.database,
-                user=self.user,
-                password=self.password,
-                port=self.port
-            )
+            self.pool = self._get_pool()
+            self.connection = self.pool.getconn()
             print(f"Connected to PostgreSQL database: {self.database}")
             return True
         except psycopg2.Error as e:
@@ -35,15 +57,39 @@ class DatabaseConnection:
 
     def disconnect(self):
         if self.connection:
-            self.connection.close()
+            # Hand the connection back to the pool (any open transaction is rolled back)
+            self.pool.putconn(self.connection)
+            self.connection = None
             print("Database connection closed.")
 
     def execute_query(self, query, params=None):
         if not self.connection:
             raise Exception("Database not connected.")
-        with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute(query, params)
-            return [dict(row) for row in cursor.fetchall()]
+        try:
+            with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(query, params)
+                # RealDictRow is already a dict subclass; no need to copy each row
+                return cursor.fetchall()
+        except psycopg2.Error as e:
+            # A failed statement aborts the transaction; roll back so the connection stays usable
+            self.connection.rollback()
+            print(f"Error executing query: {e}")
+            raise
+
+    def execute_query_iter(self, query, params=None, itersize=10000):
+        """Yield rows from a server-side cursor, fetching itersize rows per round-trip"""
+        if not self.connection:
+            raise Exception("Database not connected.")
+        name = f"query_iter_{next(_cursor_ids)}"
+        try:
+            with self.connection.cursor(name=name, cursor_factory=RealDictCursor) as cursor:
+                cursor.itersize = itersize
+                cursor.execute(query, params)
+                yield from cursor
+        except psycopg2.Error as e:
+            self.connection.rollback()
+            print(f"Error executing query: {e}")
+            raise
 
     def execute_update(self, query, params=None):
         if not self.connection:
@@ -57,3 +103,29 @@ class DatabaseConnection:
             self.connection.rollback()
             print(f"Error executing update: {e}")
             raise
+
+    def execute_values(self, query, rows, template=None, page_size=500):
+        if not self.connection:
+            raise Exception("Database not connected.")
+        try:
+            with self.connection.cursor() as cursor:
+                execute_values(cursor, query, rows, template=template, page_size=page_size)
+                self.connection.commit()
+                return cursor.rowcount
+        except psycopg2.Error as e:
+            self.connection.rollback()
+            print(f"Error executing batch update: {e}")
+            raise
+
+    def copy_expert(self, query, file):
+        if not self.connection:
+            raise Exception("Database not connected.")
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.copy_expert(query, file)
+                self.connection.commit()
+                return cursor.rowcount
+        except psycopg2.Error as e:
+            self.connection.rollback()
+            print(f"Error executing copy: {e}")
+            raise
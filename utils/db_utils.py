@@ -4,58 +4,105 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from utils.db import DatabaseConnection
 from typing import List, Dict
+import numpy as np
 
-def ensure_vector_extension(db: DatabaseConnection):
-    result = db.execute_query("SELECT 1 FROM pg_extension WHERE extname = 'vector';")
-    if not result:
-        print("Installing vector extension...")
-        db.execute_update("CREATE EXTENSION IF NOT EXISTS vector;")
-        print("Vector extension installed successfully.")
-    else:
-        print("Vector extension is already installed.")
-
-def ensure_table_schema(db: DatabaseConnection):
-    result = db.execute_query("""
-        SELECT column_name, data_type
-        FROM information_schema.columns
-        WHERE table_name = 'faq_embeddings' AND column_name = 'embedding';
+def normalize_embeddings(embeddings: List[List[float]]) -> np.ndarray:
+    # faq_embeddings.embedding holds unit vectors, so cosine similarity reduces to a dot product
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def to_vector_literal(vector: np.ndarray) -> str:
+    # pgvector text format; float32 values print in their shortest round-trip form,
+    # roughly half the size of a Python float list rendered as a numeric[] ARRAY
+    return '[' + ','.join(map(str, np.asarray(vector, dtype=np.float32))) + ']'
+
+def _copy_text_value(value) -> str:
+    # COPY text format: \N is NULL; backslash, tab and newline characters must be escaped
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+def table_is_empty(db: DatabaseConnection, table: str) -> bool:
+    return not db.execute_query(f"SELECT 1 FROM {table} LIMIT 1;")
+
+class _LineStream:
+    """Minimal read()-only file object that pulls COPY lines from an iterator on demand"""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+def copy_rows(db: DatabaseConnection, table: str, columns: List[str], rows):
+    """Stream rows into table with a single COPY ... FROM STDIN"""
+    # Lines are formatted on demand as psycopg2 reads each chunk, so memory stays bounded
+    # by the read size instead of holding the whole COPY payload at once
+    lines = ('\t'.join(_copy_text_value(value) for value in row) + '\n' for row in rows)
+    db.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", _LineStream(lines))
+
+def ensure_schema(db: DatabaseConnection):
+    # One round-trip: the DDL only runs when the table is missing, because CREATE ... IF NOT
+    # EXISTS still checks privileges and fails for roles without CREATE on the schema.
+    # Columns match sql/create_faq_embeddings_table.sql.
+    db.execute_update("""
+        DO $$
+        BEGIN
+            IF to_regclass('faq_embeddings') IS NULL THEN
+                CREATE EXTENSION IF NOT EXISTS vector;
+                CREATE TABLE faq_embeddings (
+                    faq_id TEXT PRIMARY KEY,
+                    category TEXT,
+                    question TEXT NOT NULL,
+                    answer TEXT,
+                    match_weight INTEGER DEFAULT 5,
+                    embedding vector(4096),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            END IF;
+        END
+        $$;
     """)
-    if not result:
-        print("Creating faq_embeddings table...")
-        create_table_query = """
-            CREATE TABLE IF NOT EXISTS faq_embeddings (
-                faq_id TEXT PRIMARY KEY,
-                category TEXT,
-                question TEXT NOT NULL,
-                answer TEXT,
-                embedding vector
-            );
-        """
-        db.execute_update(create_table_query)
-        print("faq_embeddings table created successfully.")
-    else:
-        print("faq_embeddings table schema is correct.")
+    print("Vector extension and faq_embeddings table are in place.")
+
+def upsert_faq_embeddings(db: DatabaseConnection, columns: List[str], rows):
+    """Write rows into faq_embeddings, overwriting the given columns of FAQs whose faq_id already exists"""
+    ensure_schema(db)
+    if table_is_empty(db, "faq_embeddings"):
+        # Initial load: nothing to conflict with, so COPY skips per-row parsing and planning
+        copy_rows(db, "faq_embeddings", columns, rows)
+        return
+    update_set = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns if column != "faq_id")
+    query = f"""
+    INSERT INTO faq_embeddings ({', '.join(columns)})
+    VALUES %s
+    ON CONFLICT (faq_id) DO UPDATE SET {update_set}, updated_at = CURRENT_TIMESTAMP;
+    """
+    template = "(" + ", ".join("%s::vector" if column == "embedding" else "%s" for column in columns) + ")"
+    # All rows in one transaction, one multi-row INSERT per page
+    db.execute_values(query, rows, template=template, page_size=500)
 
 def save_embeddings_to_db(db: DatabaseConnection, faqs: List[Dict], embeddings: List[List[float]]):
-    ensure_vector_extension(db)
-    ensure_table_schema(db)
-    for i, (faq, embedding) in enumerate(zip(faqs, embeddings)):
-        query = """
-        INSERT INTO faq_embeddings (faq_id, category, question, answer, embedding)
-        VALUES (%s, %s, %s, %s, %s::vector)
-        ON CONFLICT (faq_id) DO UPDATE SET
-            category = EXCLUDED.category,
-            question = EXCLUDED.question,
-            answer = EXCLUDED.answer,
-            embedding = EXCLUDED.embedding;
-        """
-        db.execute_update(query, (
-            faq.get("faq_id"),
-            faq.get("category"),
-            faq.get("question"),
-            faq.get("answer"),
-            embedding
-        ))
-        if (i + 1) % 10 == 0:
-            print(f"Processed {i + 1}/{len(faqs)} embeddings...")
+    # Rows are produced lazily and consumed page by page by the INSERT or COPY
+    rows = ((
+        faq.get("faq_id"),
+        faq.get("category"),
+        faq.get("question"),
+        faq.get("answer"),
+        to_vector_literal(embedding)
+    ) for faq, embedding in zip(faqs, normalize_embeddings(embeddings)))
+    upsert_faq_embeddings(db, ["faq_id", "category", "question", "answer", "embedding"], rows)
     print(f"Successfully saved {len(faqs)} embeddings to the database.")
@@ -0,0 +1,66 @@
+# embedding_cache.py
+import hashlib
+import os
+import sqlite3
+import time
+from array import array
+from typing import Callable, List, Optional
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', '.embedding_cache.sqlite3')
+
+class EmbeddingCache:
+    """On-disk embedding store keyed by a hash of the model name and input text"""
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path or os.getenv('EMBED_CACHE_PATH', DEFAULT_CACHE_PATH)
+        ttl = ttl if ttl is not None else os.getenv('EMBED_CACHE_TTL')
+        self.ttl = float(ttl) if ttl else None  # seconds; None keeps entries forever
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                embedding BLOB NOT NULL,
+                created_at REAL NOT NULL
+            );
+        """)
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.blake2b(f"{model}:{text}".encode('utf-8'), digest_size=32).hexdigest()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        row = self.connection.execute(
+            "SELECT embedding, created_at FROM embeddings WHERE key = ?;",
+            (self.make_key(model, text),)
+        ).fetchone()
+        if row is None:
+            return None
+        embedding, created_at = row
+        if self.ttl is not None and time.time() - created_at > self.ttl:
+            return None
+        return array('d', embedding).tolist()
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, embedding, created_at) VALUES (?, ?, ?);",
+            [(self.make_key(model, text), array('d', embedding).tobytes(), now)
+             for text, embedding in zip(texts, embeddings)]
+        )
+        self.connection.commit()
+
+    def get_or_compute_many(self, texts: List[str], model: str,
+                            compute: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Return embeddings for texts, calling compute only for the ones not cached"""
+        embeddings = [self.get(model, text) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = compute([texts[i] for i in missing])
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+            self.put_many(model, [texts[i] for i in missing], computed)
+        return embeddings
+
+    def close(self):
+        self.connection.close()